@@ -1,26 +1,42 @@
 import asyncio
-from asyncio import Queue, Task
+from asyncio import Task
+from collections import deque
 import curses
 import sys
 from typing import Callable
 
-class QuitEv: pass
+class QuitEv: __slots__ = ()
 QUIT = QuitEv()
 
+class FastQueue:
+    __slots__ = ('_dq', '_ev')
+
+    def __init__(self) -> None:
+        self._dq = deque()
+        self._ev = asyncio.Event()
+
+    def put_nowait(self, obj):
+        self._dq.append(obj)
+        self._ev.set()
+
+    async def get(self):
+        while not self._dq:
+            self._ev.clear()
+            await self._ev.wait()
+        return self._dq.popleft()
+
 class Service:
     def __init__(self, name: str) -> None:
-        self._subs: dict[str, Queue] = {}
+        self._handlers: dict[str, Callable] = {}
+        self._sync_topics: set[str] = set()
+        self._inbox: FastQueue = FastQueue()
         self._name = name
-        self._queue_consumers: list[Task] = []
+        self._dispatcher_task: Task | None = None
         self._service_task: Task | None = None
         self._manager: 'ServiceManager'
 
     def __post_init__(self) -> None: ...
 
-    async def on_pub(self, topic: str, obj):
-        assert topic in self._subs
-        await self._subs[topic].put(obj)
-
     async def run(self):
         raise NotImplementedError()
 
@@ -31,27 +47,38 @@ class Service:
     def name(self):
         return self._name
 
-    def sub(self, topic: str, func):
-        assert topic not in self._subs
-        assert self._manager is not None
+    async def _dispatcher(self):
+        while True:
+            topic, obj = await self._inbox.get()
+            if obj == QUIT:
+                del self._handlers[topic]
+                self._sync_topics.discard(topic)
+                continue
 
-        queue = Queue()
+            try:
+                if topic in self._sync_topics:
+                    self._handlers[topic](obj)
+                else:
+                    await self._handlers[topic](obj)
+            except Exception as e:
+                # a failing log handler must not feed itself more log messages
+                if topic != 'log':
+                    self.log(2, f'{self.name}: {topic} handler failed: {e!r}')
 
-        async def _topic_listener():
-            while True:
-                e = await queue.get()
-                if e == QUIT: break
+    def sub(self, topic: str, func):
+        assert topic not in self._handlers
+        assert self._manager is not None
 
-                await func(e)
+        self._handlers[topic] = func
+        if self._dispatcher_task is None:
+            self._dispatcher_task = asyncio.create_task(self._dispatcher())
+        self._manager._register_sub(topic, self._inbox)
 
-        self._subs[topic] = queue
-        task = asyncio.create_task(_topic_listener())
-        self._queue_consumers.append(task)
-        self._manager._register_sub(topic, self)
+    def sub_sync(self, topic: str, func):
+        self.sub(topic, func)
+        self._sync_topics.add(topic)
 
     def pub(self, topic: str, obj):
-        assert self._manager is not None
-
         self._manager.pub(topic, obj)
 
     def create_topic(self, topic: str):
@@ -59,66 +86,48 @@ class Service:
 
         self._manager.create_topic(topic)
 
-    def run_as_task(self, coro):
+    def spawn(self, coro):
         assert self._manager is not None
-        self._manager.run_as_task(coro)
+        return self._manager.spawn(coro)
 
     def log(self, level, txt):
+        if level < self._manager.min_log_level: return
         self.pub('log', (level, txt))
 
-class TaskAwaiter:
-    def __init__(self, tasks, manager):
-        self._tasks = tasks
-        self._own_task = asyncio.create_task(self._await_tasks())
-        self._manager = manager
-        self._idx = manager._awaiter_counter
-        manager._task_awaiters[self._idx] = self
-        manager._awaiter_counter += 1
-        self._done = asyncio.Event()
-
-    async def _await_tasks(self):
-        if self._tasks:
-            await asyncio.wait(self._tasks)
-        del self._manager._task_awaiters[self._idx]
-        self._done.set()
-
-    def done(self):
-        return self._done.wait()
+    def log_lazy(self, level, fmt, *args):
+        if level < self._manager.min_log_level: return
+        self.pub('log', (level, fmt % args))
 
 class ServiceManager:
-    def __init__(self) -> None:
+    def __init__(self, min_log_level: int = 0) -> None:
+        self.min_log_level = min_log_level
         self._services: dict[str, Service] = {}
-        self._topics: dict[str, set[str]] = {}
-        self._task_awaiters: dict[int, TaskAwaiter] = {}
-        self._awaiter_counter = 0
+        self._topics: dict[str, list[FastQueue]] = {}
+        self._bg_tasks: set[Task] = set()
         self._quit = asyncio.Event()
         self.create_topic('log')
 
     def _get_topic(self, topic: str):
-        assert topic in self._topics
-
         return self._topics[topic]
 
     def create_topic(self, topic: str):
         assert topic not in self._topics
 
-        self._topics[topic] = set()
+        self._topics[topic] = []
 
     def pub(self, topic: str, obj):
-        tasks = []
-        for sub in self._get_topic(topic):
-            task = asyncio.create_task(self._services[sub].on_pub(topic, obj))
-            tasks.append(task)
-        return self.run_tasks(tasks)
+        msg = (topic, obj)
+        for queue in self._topics[topic]:
+            queue.put_nowait(msg)
 
     def close_topic(self, topic: str):
         self.pub(topic, QUIT)
         del self._topics[topic]
 
-    def _register_sub(self, topic: str, service: Service):
-        assert service.name in self._services
+    def _register_sub(self, topic: str, queue: FastQueue):
+        assert topic in self._topics
 
-        self._get_topic(topic).add(service.name)
+        self._get_topic(topic).append(queue)
 
     def register(self, service: Service):
         self._services[service.name] = service
@@ -127,17 +136,16 @@ class ServiceManager:
         service.__post_init__()
         return service
 
-    def run_tasks(self, tasks):
-        return TaskAwaiter(tasks, self)
-
-    def run_as_task(self, coro):
-        return TaskAwaiter([asyncio.create_task(coro)], self)
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
 
     async def wait(self):
         await self._quit.wait()
-        while self._task_awaiters:
-            awaiter = list(self._task_awaiters.values())[0]
-            await awaiter.done()
+        while self._bg_tasks:
+            await asyncio.gather(*self._bg_tasks, return_exceptions=True)
 
 class InputService(Service):
     def __init__(self, window: curses.window) -> None:
@@ -149,36 +157,45 @@ class InputService(Service):
         self._window.keypad(True)
 
         loop = asyncio.get_event_loop()
-        input_ev = asyncio.Event()
-        loop.add_reader(sys.stdin, input_ev.set)
+        loop.add_reader(sys.stdin, self._drain)
+        try:
+            await asyncio.Future()
+        finally:
+            loop.remove_reader(sys.stdin)
 
+    def _drain(self):
         while True:
-            await input_ev.wait()
-            input_ev.clear()
-
             try:
                 c = self._window.get_wch()
             except curses.error:
-                continue
+                break
 
             self.pub('raw-input', c)
 
+REFRESH_INTERVAL = 1 / 60
+
 class CursesService(Service):
     def __init__(self, stdscr: curses.window) -> None:
         super().__init__('curses')
         self._inp_win = curses.newwin(1, 1, 0, 0)
         self._stdscr = stdscr
-        self._buf = []
+        self._buf_str = ''
         self._editing = False
         self._edit_cursor = 0
         self._cursor = 0
         self._color: int = 0
+        self._refresh_ev = asyncio.Event()
+        self._row_cache: dict[int, tuple[str, int]] = {}
+        self._log_cache: tuple[str, int] | None = None
 
     def __post_init__(self) -> None:
         self._input_svc = self._manager.register(InputService(self._inp_win))
         self._input_svc.start()
+        self.start()
 
         curses.init_pair(1, curses.COLOR_RED, curses.COLOR_BLACK)
+        self._red_pair = curses.color_pair(1)
+        self._lines = curses.LINES
         self._stdscr.refresh()
 
         self.create_topic('line')
@@ -188,36 +205,46 @@ class CursesService(Service):
         self.create_topic('edit/end')
         self.create_topic('input')
 
-        self.sub('line', self.on_line)
-        self.sub('color', self.on_color)
-        self.sub('raw-input', self.on_input)
-        self.sub('edit/start', self.on_start_edit)
-        self.sub('log', self.on_log)
+        self.sub_sync('line', self.on_line)
+        self.sub_sync('color', self.on_color)
+        self.sub_sync('raw-input', self.on_input)
+        self.sub_sync('edit/start', self.on_start_edit)
+        self.sub_sync('log', self.on_log)
+
+    def on_input(self, c):
+        if c == curses.KEY_RESIZE:
+            curses.update_lines_cols()
+            self._lines = curses.LINES
+            self._redraw()
 
-    async def on_input(self, c):
         if self._editing:
             if c == curses.KEY_LEFT:
-                self._edit_cursor = max(self._edit_cursor - 1, 0)
+                if self._edit_cursor > 0:
+                    self._edit_cursor -= 1
+                    self.refresh()
             elif c == curses.KEY_RIGHT:
-                self._edit_cursor = min(self._edit_cursor + 1, len(self._buf))
+                if self._edit_cursor < len(self._buf_str):
+                    self._edit_cursor += 1
+                    self.refresh()
             elif c == curses.KEY_BACKSPACE:
                 if self._edit_cursor > 0:
                     self._edit_cursor -= 1
-                    del self._buf[self._edit_cursor]
+                    i = self._edit_cursor
+                    self._buf_str = self._buf_str[:i] + self._buf_str[i+1:]
+                    self._draw_edit_tail(self._edit_cursor)
             elif c == '\n' or c == curses.KEY_ENTER:
-                self.pub('edit/end', ''.join(self._buf))
-                self._buf = []
+                self.pub('edit/end', self._buf_str)
+                self._buf_str = ''
                 self._edit_cursor = 0
                 self._editing = False
+                self._draw_edit_tail(0)
             elif isinstance(c, str):
-                self._buf.insert(self._edit_cursor, c)
+                i = self._edit_cursor
+                self._buf_str = self._buf_str[:i] + c + self._buf_str[i:]
+                self._draw_edit_tail(self._edit_cursor)
                 self._edit_cursor += 1
-            self._stdscr.addstr(curses.LINES-1, 0, ''.join(self._buf), self._color)
-            self._stdscr.clrtoeol()
-
-            self.refresh()
         else:
-            self.log(0, f'input {c!r}')
+            self.log_lazy(0, 'input %r', c)
 
             if c == curses.KEY_UP:
                 self.set_cursor(self._cursor - 1)
@@ -225,41 +252,69 @@ class CursesService(Service):
                 self.set_cursor(self._cursor + 1)
             self.pub('input', c)
 
+    async def run(self):
+        while True:
+            await self._refresh_ev.wait()
+            self._refresh_ev.clear()
+
+            if self._editing:
+                self._stdscr.move(self._lines-1, self._edit_cursor)
+            else:
+                self._stdscr.move(self._cursor, 0)
+            self._stdscr.refresh()
+
+            await asyncio.sleep(REFRESH_INTERVAL)
+
     def refresh(self):
+        self._refresh_ev.set()
+
+    def _redraw(self):
+        self._stdscr.erase()
+        for row, (line, color) in self._row_cache.items():
+            if row < self._lines-2:
+                self._stdscr.addstr(row, 1, line, color)
+        if self._log_cache is not None:
+            self._stdscr.addstr(self._lines-2, 0, *self._log_cache)
         if self._editing:
-            self._stdscr.move(curses.LINES-1, self._edit_cursor)
-        else:
-            self._stdscr.move(self._cursor, 0)
-        self._stdscr.refresh()
+            self._stdscr.addstr(self._lines-1, 0, self._buf_str, self._color)
+        self.refresh()
+
+    def _draw_edit_tail(self, start: int):
+        self._stdscr.addstr(self._lines-1, start, self._buf_str[start:], self._color)
+        self._stdscr.clrtoeol()
+        self.refresh()
 
     def set_cursor(self, cursor: int):
         if cursor != self._cursor:
-            self._cursor = max(min(cursor, curses.LINES-3), 0)
+            self._cursor = max(min(cursor, self._lines-3), 0)
             self.pub('cursor', cursor)
         self.refresh()
 
-    async def on_start_edit(self, text):
+    def on_start_edit(self, text):
         self._editing = True
-        self._buf = list(text)
-        self._stdscr.addstr(curses.LINES-1, 0, ''.join(self._buf), self._color)
+        self._buf_str = text
+        self._stdscr.addstr(self._lines-1, 0, self._buf_str, self._color)
         self.refresh()
 
-    async def on_line(self, lineobj: tuple[int, str]):
+    def on_line(self, lineobj: tuple[int, str]):
         row, line = lineobj
+        if self._row_cache.get(row) == (line, self._color): return
         self._stdscr.addstr(row, 1, line, self._color)
         self._stdscr.clrtoeol()
+        self._row_cache[row] = (line, self._color)
         self.refresh()
 
-    async def on_log(self, logobj: tuple[int, str]):
-        severity = logobj[0]
-        old_color = self._color
+    def on_log(self, logobj: tuple[int, str]):
+        severity, txt = logobj
         #if severity == 0: return
+        color = self._color
         if severity >= 2:
-            self._color = curses.color_pair(1)
-        self._stdscr.addstr(curses.LINES-2, 0, logobj[1], self._color)
-        self._color = old_color
+            color = self._red_pair
+        if self._log_cache == (txt, color): return
+        self._stdscr.addstr(self._lines-2, 0, txt, color)
         self._stdscr.clrtoeol()
+        self._log_cache = (txt, color)
         self.refresh()
 
-    async def on_color(self, color):
+    def on_color(self, color):
         self._color = color
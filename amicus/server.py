@@ -1,6 +1,7 @@
 import asyncio
 import argparse
 import curses
+import heapq
 from .common import Service, ServiceManager, CursesService
 from asyncio import StreamReader, StreamWriter
 from time import time
@@ -40,56 +41,82 @@ class ClientHandlerService(Service):
         self.create_topic('client-progress')
         self.create_topic('client-alert')
 
-        self.sub('listener', self.new_client)
+        self.sub_sync('listener', self.new_client)
 
-    async def new_client(self, rw_pair: tuple[StreamReader, StreamWriter]):
+    def new_client(self, rw_pair: tuple[StreamReader, StreamWriter]):
         idx = self._counter
         self._counter += 1
 
         prefix = f'{self.name}/{idx}'
         self.pub('client-join', (idx, prefix))
-        self.log(0, f'client-join {idx} {prefix}')
+        self.log_lazy(0, 'client-join %d %s', idx, prefix)
 
-        self.create_topic(f'{prefix}/progress')
-        self.create_topic(f'{prefix}/alert')
-        self.create_topic(f'{prefix}/recv')
-        self.create_topic(f'{prefix}/send')
-        self.create_topic(f'{prefix}/keepalive')
+        topic_progress = f'{prefix}/progress'
+        topic_alert = f'{prefix}/alert'
+        topic_recv = f'{prefix}/recv'
+        topic_send = f'{prefix}/send'
+        topic_keepalive = f'{prefix}/keepalive'
+
+        self.create_topic(topic_progress)
+        self.create_topic(topic_alert)
+        self.create_topic(topic_recv)
+        self.create_topic(topic_send)
+        self.create_topic(topic_keepalive)
 
         reader, writer = rw_pair
 
-        async def client_update(line: bytes):
-            args = line.decode().split()
-            if args[0] == 'progress':
+        def client_update(line: bytes):
+            args = line.split()
+            if not args: return
+            cmd = args[0]
+            if cmd == b'keepalive':
+                self.log_lazy(0, 'keepalive %d', idx)
+                self.pub(topic_keepalive, None)
+            elif cmd == b'progress':
                 if len(args) == 3:
-                    progress = int(args[1]) / int(args[2])
-                else:
+                    try:
+                        progress = int(args[1]) / int(args[2])
+                    except (ValueError, ZeroDivisionError):
+                        self.log(2, f'client {idx} sent invalid progress {line!r}')
+                        return
+                elif len(args) > 1:
                     try:
                         progress = float(args[1]) / 100
-                    except:
-                        progress = args[1]
-                self.log(0, f'progress {idx} {progress}')
-                self.pub(f'{prefix}/progress', progress)
-                self.pub(f'client-progress', (idx, progress))
-            elif args[0] == 'alert':
-                self.log(0, f'alert {idx} {args[1]}')
-                self.pub(f'{prefix}/alert', args[1])
-                self.pub(f'client-alert', (idx, args[1]))
-            elif args[0] == 'done':
-                self.log(0, f'done {idx}')
-                self.pub(f'client-done', idx)
-            elif args[0] == 'keepalive':
-                self.log(0, f'keepalive {idx}')
-                self.pub(f'{prefix}/keepalive', None)
-
-        async def _writer(line: bytes):
+                    except ValueError:
+                        progress = args[1].decode(errors='replace')
+                else:
+                    self.log(2, f'client {idx} sent invalid progress {line!r}')
+                    return
+                self.log_lazy(0, 'progress %d %s', idx, progress)
+                self.pub(topic_progress, progress)
+                self.pub('client-progress', (idx, progress))
+            elif cmd == b'alert':
+                if len(args) < 2:
+                    self.log(2, f'client {idx} sent alert without text')
+                    return
+                alert = args[1].decode(errors='replace')
+                self.log_lazy(0, 'alert %d %s', idx, alert)
+                self.pub(topic_alert, alert)
+                self.pub('client-alert', (idx, alert))
+            elif cmd == b'done':
+                self.log_lazy(0, 'done %d', idx)
+                self.pub('client-done', idx)
+
+        def on_recv(lines: list[bytes]):
+            for line in lines:
+                client_update(line)
+
+        def _writer(line: bytes):
             writer.write(line)
 
         async def _reader():
             try:
                 while True:
-                    line = await reader.readuntil(b'\n')
-                    self.pub(f'{prefix}/recv', line)
+                    lines = [await reader.readuntil(b'\n')]
+                    # lines that are already buffered are read without yielding
+                    while b'\n' in reader._buffer:
+                        lines.append(await reader.readuntil(b'\n'))
+                    self.pub(topic_recv, lines)
             except asyncio.IncompleteReadError:
                 self.pub('client-leave', idx)
         def keepalive():
@@ -100,15 +127,15 @@ class ClientHandlerService(Service):
                 if time() - last_time > 10:
                     self.pub(f'client-leave', idx)
 
-        self.sub(f'{prefix}/recv', client_update)
-        self.sub(f'{prefix}/send', _writer)
+        self.sub_sync(topic_recv, on_recv)
+        self.sub_sync(topic_send, _writer)
 
-        self.run_as_task(_reader())
+        self.spawn(_reader())
 
 from dataclasses import dataclass
 
 class ClientService(Service):
-    @dataclass
+    @dataclass(slots=True)
     class Client:
         idx: int
         status: int
@@ -124,41 +151,45 @@ class ClientService(Service):
     def __init__(self) -> None:
         super().__init__('client')
         self.clients: list[ClientService.Client] = []
+        self._by_idx: dict[int, ClientService.Client] = {}
+        self._free: list[int] = []
 
     def __post_init__(self) -> None:
         self.create_topic('client-refresh')
         self.create_topic('client-rename')
 
-        self.sub('client-rename', self.on_rename)
+        self.sub_sync('client-rename', self.on_rename)
 
-        self.sub('client-join', self.on_client_join)
-        self.sub('client-leave', self.on_client_leave)
-        self.sub('client-done', self.on_client_done)
-        self.sub('client-progress', self.on_client_progress)
+        self.sub_sync('client-join', self.on_client_join)
+        self.sub_sync('client-leave', self.on_client_leave)
+        self.sub_sync('client-done', self.on_client_done)
+        self.sub_sync('client-progress', self.on_client_progress)
 
     def _refresh(self, idx: int):
         self.pub('client-refresh', self.clients[idx])
 
-    async def on_rename(self, clientobj: tuple[int, str]):
+    def on_rename(self, clientobj: tuple[int, str]):
         idx, newname = clientobj
         self.clients[idx].name = newname
         self._refresh(idx)
 
-    async def on_client_join(self, clientobj: tuple[int, str]):
+    def on_client_join(self, clientobj: tuple[int, str]):
         idx, prefix = clientobj
-        if c := self.get_client(-1):
+        if self._free:
+            c = self.clients[heapq.heappop(self._free)]
             c.idx = idx
             c.status = 0
             c.progress = 0
         else:
             c = ClientService.Client(idx, 0, prefix, 0, len(self.clients))
-            self.log(0, f'client-join {c}')
+            self.log_lazy(0, 'client-join %s', c)
 
             self.clients.append(c)
 
+        self._by_idx[idx] = c
         self._refresh(c.listidx)
 
-    async def on_client_progress(self, clientobj: tuple[int, float]):
+    def on_client_progress(self, clientobj: tuple[int, float]):
         idx, progress = clientobj
         if c := self.get_client(idx):
             c.progress = progress
@@ -167,20 +198,19 @@ class ClientService(Service):
             self.log(2, f'client {idx} progressed without joining')
 
     def get_client(self, idx: int):
-        for c in self.clients:
-            if c.idx == idx:
-                return c
+        return self._by_idx.get(idx)
 
-    async def on_client_done(self, idx: int):
+    def on_client_done(self, idx: int):
         if c := self.get_client(idx):
             c.status = 1
             self._refresh(c.listidx)
         else:
             self.log(2, f'client {idx} was done without joining')
 
-    async def on_client_leave(self, idx: int):
-        if c := self.get_client(idx):
+    def on_client_leave(self, idx: int):
+        if c := self._by_idx.pop(idx, None):
             c.idx = -1
+            heapq.heappush(self._free, c.listidx)
 
             if c.status != 1:
                 self.log(2, f'client {idx} ({c.name}) left without being done')
@@ -190,50 +220,57 @@ class ClientService(Service):
         else:
             self.log(2, f'client {idx} left without joining')
 
+STATUSES = (
+    '-- GRAVANDO --',
+    '!! SUCESSO !! ',
+    '#### ERRO ####'
+)
+
 class ScreenService(Service):
     def __init__(self) -> None:
         super().__init__('screen')
         self._names: dict[int, str] = {}
+        self._padded_names: dict[int, str] = {}
+        self._last_line: dict[int, str] = {}
         self._cursor: int = 0
 
     def __post_init__(self) -> None:
-        async def on_cursor(c):
+        def on_cursor(c):
             self._cursor = c
 
-        async def on_input(c):
+        def on_input(c):
             if c != '\n': return
             cursor = self._cursor
             if cursor in self._names:
                 name = self._names[cursor]
                 self.pub('edit/start', name)
 
-        async def on_finish_edit(newname):
+        def on_finish_edit(newname):
             self.pub('client-rename', (self._cursor, newname))
 
-        async def on_refresh(client: ClientService.Client):
-            self._names[client.listidx] = client.name
-            statuses = [
-                '-- GRAVANDO --',
-                '!! SUCESSO !! ',
-                '#### ERRO ####'
-            ]
-            status = statuses[client.status]
+        def on_refresh(client: ClientService.Client):
+            listidx = client.listidx
+            if self._names.get(listidx) != client.name:
+                self._names[listidx] = client.name
+                self._padded_names[listidx] = f'{client.name:<16}'
             if isinstance(client.progress, float):
                 progress = f'{client.progress*100:.2f}%'
             else:
                 progress = client.progress
-            line = f'{status} | {client.name:<16}| {progress}'
-            self.pub('line', (client.listidx, line))
+            line = f'{STATUSES[client.status]} | {self._padded_names[listidx]}| {progress}'
+            if self._last_line.get(listidx) == line: return
+            self._last_line[listidx] = line
+            self.pub('line', (listidx, line))
 
-        self.sub('cursor', on_cursor)
-        self.sub('input', on_input)
-        self.sub('edit/end', on_finish_edit)
-        self.sub('client-refresh', on_refresh)
+        self.sub_sync('cursor', on_cursor)
+        self.sub_sync('input', on_input)
+        self.sub_sync('edit/end', on_finish_edit)
+        self.sub_sync('client-refresh', on_refresh)
 
 
 class Server(ServiceManager):
-    def __init__(self, stdscr: curses.window, ip, port, ntfy_full_url) -> None:
-        super().__init__()
+    def __init__(self, stdscr: curses.window, ip, port, ntfy_full_url, min_log_level: int = 0) -> None:
+        super().__init__(min_log_level)
         self._notif_svc = self.register(NotificationService(ntfy_full_url))
         self._curses_svc = self.register(CursesService(stdscr))
         self._listener_svc = self.register(ListenerService(ip, port))
@@ -252,11 +289,26 @@ async def amain(*,
                 listen_ip: str,
                 listen_port: int,
                 ntfy_url: str = DEFAULT_NTFY_URL,
-                ntfy_topic: str | None = None):
-    server = Server(stdscr, listen_ip, listen_port, ntfy_full_url=ntfy_url)
+                ntfy_topic: str | None = None,
+                log_level: int = 0):
+    server = Server(stdscr, listen_ip, listen_port, ntfy_full_url=ntfy_url, min_log_level=log_level)
 
     await server.wait()
 
+def install_event_loop(io_uring: bool = False):
+    if io_uring:
+        from .uring import IoUringEventLoopPolicy, IoUringSelector
+        # fail before curses takes over the terminal if the kernel refuses io_uring
+        IoUringSelector().close()
+        asyncio.set_event_loop_policy(IoUringEventLoopPolicy())
+        return
+
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
 def main(argv: list[str], prog: str = 'server'):
     parser = argparse.ArgumentParser(prog)
     parser.add_argument('--ip-block')
@@ -265,12 +317,21 @@ def main(argv: list[str], prog: str = 'server'):
     parser.add_argument('--listen-port', type=int, default=12345)
     parser.add_argument('--ntfy-url', default=DEFAULT_NTFY_URL)
     parser.add_argument('--ntfy-topic')
+    parser.add_argument('--log-level', type=int, default=0)
+    parser.add_argument('--io-uring', action='store_true')
 
     args = parser.parse_args(argv)
 
     if args.ntfy_url:
         assert '{topic}' in args.ntfy_url
 
+    try:
+        install_event_loop(args.io_uring)
+    except ImportError:
+        parser.error('--io-uring requires the liburing package')
+    except OSError as e:
+        parser.error(f'--io-uring is not supported here: {e}')
+
     def wrapped_main(stdscr: curses.window):
         asyncio.run(amain(
             stdscr=stdscr,
@@ -279,7 +340,8 @@ def main(argv: list[str], prog: str = 'server'):
             listen_ip=args.listen_ip,
             listen_port=args.listen_port,
             ntfy_url=args.ntfy_url,
-            ntfy_topic=args.ntfy_topic
+            ntfy_topic=args.ntfy_topic,
+            log_level=args.log_level
         ))
 
     curses.wrapper(wrapped_main)
@@ -0,0 +1,110 @@
+import asyncio
+import errno
+import selectors
+from select import POLLIN, POLLOUT, POLLERR, POLLHUP
+
+import liburing
+
+class IoUringSelector(selectors._BaseSelectorImpl):
+    def __init__(self, entries: int = 256) -> None:
+        super().__init__()
+        self._ring = liburing.Ring()
+        liburing.io_uring_queue_init(entries, self._ring)
+        self._cqe = liburing.Cqe()
+        # fd -> user data of its armed poll, and back
+        self._polls: dict[int, int] = {}
+        self._poll_fds: dict[int, int] = {}
+        self._next_data = 1
+
+    def _get_sqe(self):
+        sqe = liburing.io_uring_get_sqe(self._ring)
+        if sqe is None:
+            liburing.io_uring_submit(self._ring)
+            sqe = liburing.io_uring_get_sqe(self._ring)
+        return sqe
+
+    def _arm(self, fd: int, events: int):
+        mask = 0
+        if events & selectors.EVENT_READ: mask |= POLLIN
+        if events & selectors.EVENT_WRITE: mask |= POLLOUT
+
+        data = self._next_data
+        self._next_data += 1
+        sqe = self._get_sqe()
+        liburing.io_uring_prep_poll_add(sqe, fd, mask)
+        liburing.io_uring_sqe_set_data64(sqe, data)
+        self._polls[fd] = data
+        self._poll_fds[data] = fd
+
+    def _disarm(self, fd: int):
+        data = self._polls.pop(fd, None)
+        if data is None: return
+        del self._poll_fds[data]
+        sqe = self._get_sqe()
+        liburing.io_uring_prep_poll_remove(sqe, data)
+        liburing.io_uring_sqe_set_data64(sqe, 0)
+
+    def register(self, fileobj, events, data=None):
+        key = super().register(fileobj, events, data)
+        self._arm(key.fd, events)
+        return key
+
+    def unregister(self, fileobj):
+        key = super().unregister(fileobj)
+        self._disarm(key.fd)
+        return key
+
+    def select(self, timeout=None):
+        ring = self._ring
+        cqe = self._cqe
+        try:
+            liburing.io_uring_submit(ring)
+            if timeout is None:
+                liburing.io_uring_wait_cqe(ring, cqe)
+            elif timeout <= 0:
+                liburing.io_uring_peek_cqe(ring, cqe)
+            else:
+                liburing.io_uring_wait_cqe_timeout(ring, cqe, liburing.timespec(timeout))
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.ETIME, errno.EINTR):
+                return []
+            raise
+
+        ready = []
+        for _ in range(liburing.io_uring_cq_ready(ring)):
+            # cqe[i] does not wrap around the ring, only read the head entry
+            try:
+                liburing.io_uring_peek_cqe(ring, cqe)
+                entry = cqe[0]
+                data, res = entry.user_data, entry.res
+            except OSError:
+                # cancelled poll or its removal request
+                data = 0
+            liburing.io_uring_cq_advance(ring, 1)
+
+            fd = self._poll_fds.pop(data, None)
+            if fd is None: continue
+            del self._polls[fd]
+
+            key = self._fd_to_key.get(fd)
+            if key is None: continue
+
+            events = 0
+            if res & (POLLIN | POLLERR | POLLHUP):
+                events |= selectors.EVENT_READ
+            if res & (POLLOUT | POLLERR | POLLHUP):
+                events |= selectors.EVENT_WRITE
+            events &= key.events
+            if events:
+                ready.append((key, events))
+            # polls are one-shot, rearm to keep level-triggered semantics
+            self._arm(fd, key.events)
+        return ready
+
+    def close(self):
+        super().close()
+        liburing.io_uring_queue_exit(self._ring)
+
+class IoUringEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    def new_event_loop(self):
+        return asyncio.SelectorEventLoop(IoUringSelector())